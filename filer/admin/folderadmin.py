@@ -2,6 +2,7 @@ import itertools
 import os
 import re
 from collections import OrderedDict
+from operator import attrgetter
 
 from django import forms
 from django.conf import settings as django_settings
@@ -44,6 +45,9 @@ from .tools import (
 
 Image = load_model(FILER_IMAGE_MODEL)
 
+# sorts files by their case-insensitive label, like File.__lt__
+file_sort_key = attrgetter('_sort_key')
+
 
 class AddFolderPopupForm(forms.ModelForm):
     folder = forms.HiddenInput()
@@ -346,7 +350,7 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
             permissions = {}
 
         if order_by is None or len(order_by) == 0:
-            folder_files.sort()
+            folder_files.sort(key=file_sort_key)
 
         items = folder_children + folder_files
         paginator = Paginator(items, FILER_PAGINATE_BY)
@@ -734,9 +738,10 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
             n = files_queryset.count() + folders_queryset.count()
             if n:
                 # delete all explicitly selected files
-                for f in files_queryset:
+                selected_files = list(files_queryset)
+                for f in selected_files:
                     self.log_deletion(request, f, force_str(f))
-                    f.delete()
+                File.objects.delete_files(selected_files)
                 # delete all files in all selected folders and their children
                 # This would happen automatically by ways of the delete
                 # cascade, but then the individual .delete() methods won't be
@@ -746,9 +751,10 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
                     folder_ids.add(folder.id)
                     folder_ids.update(
                         folder.get_descendants().values_list('id', flat=True))
-                for f in File.objects.filter(folder__in=folder_ids):
+                folder_files = list(File.objects.filter(folder__in=folder_ids))
+                for f in folder_files:
                     self.log_deletion(request, f, force_str(f))
-                    f.delete()
+                File.objects.delete_files(folder_files)
                 # delete all folders
                 for f in folders_queryset:
                     self.log_deletion(request, f, force_str(f))
@@ -841,13 +847,13 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
         for fo in folders:
             yield self._format_callback(fo, request.user, self.admin_site, set())
             children = list(self._list_folders_to_copy_or_move(request, fo.children.all()))
-            children.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(fo.files)])
+            children.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(fo.files, key=file_sort_key)])
             if children:
                 yield children
 
     def _list_all_to_copy_or_move(self, request, files_queryset, folders_queryset):
         to_copy_or_move = list(self._list_folders_to_copy_or_move(request, folders_queryset))
-        to_copy_or_move.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(files_queryset)])
+        to_copy_or_move.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(files_queryset, key=file_sort_key)])
         return to_copy_or_move
 
     def _list_all_destination_folders_recursive(self, request, folders_queryset, current_folder, folders, allow_self, level):
@@ -952,7 +958,7 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
 
     def _rename_files(self, files, form_data, global_counter):
         n = 0
-        for f in sorted(files):
+        for f in sorted(files, key=file_sort_key):
             self._rename_file(f, form_data, n, global_counter + n)
             n += 1
         return n
@@ -983,7 +989,7 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
                 raise PermissionDenied
             form = RenameFilesForm(request.POST)
             if form.is_valid():
-                if files_queryset.count() + folders_queryset.count():
+                if files_queryset.exists() or folders_queryset.exists():
                     n = self._rename_files_impl(files_queryset, folders_queryset, form.cleaned_data, 0)
                     self.message_user(request, _("Successfully renamed %(count)d files.") % {
                         "count": n,
@@ -1103,7 +1109,7 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
                 folders_dict = dict(folders)
                 if destination not in folders_dict or not folders_dict[destination][1]:
                     raise PermissionDenied
-                if files_queryset.count() + folders_queryset.count():
+                if files_queryset.exists() or folders_queryset.exists():
                     # We count all files and folders here (recursively)
                     n = self._copy_files_and_folders_impl(files_queryset, folders_queryset, destination, form.cleaned_data['suffix'], False)
                     self.message_user(request, _("Successfully copied %(count)d files and/or folders to folder '%(destination)s'.") % {
@@ -1157,14 +1163,14 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
     def _list_folders_to_resize(self, request, folders):
         for fo in folders:
             children = list(self._list_folders_to_resize(request, fo.children.all()))
-            children.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(fo.files) if isinstance(f, Image)])
+            children.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(fo.files, key=file_sort_key) if isinstance(f, Image)])
             if children:
                 yield self._format_callback(fo, request.user, self.admin_site, set())
                 yield children
 
     def _list_all_to_resize(self, request, files_queryset, folders_queryset):
         to_resize = list(self._list_folders_to_resize(request, folders_queryset))
-        to_resize.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(files_queryset) if isinstance(f, Image)])
+        to_resize.extend([self._format_callback(f, request.user, self.admin_site, set()) for f in sorted(files_queryset, key=file_sort_key) if isinstance(f, Image)])
         return to_resize
 
     def _new_subject_location(self, original_width, original_height, new_width, new_height, x, y, crop):
@@ -1245,7 +1251,7 @@ class FolderAdmin(PrimitivePermissionAwareModelAdmin):
                     form.cleaned_data['height'] = form.cleaned_data['thumbnail_option'].height
                     form.cleaned_data['crop'] = form.cleaned_data['thumbnail_option'].crop
                     form.cleaned_data['upscale'] = form.cleaned_data['thumbnail_option'].upscale
-                if files_queryset.count() + folders_queryset.count():
+                if files_queryset.exists() or folders_queryset.exists():
                     # We count all files here (recursively)
                     n = self._resize_images_impl(files_queryset, folders_queryset, form.cleaned_data)
                     self.message_user(request, _("Successfully resized %(count)d images.") % {"count": n, })
@@ -1,7 +1,6 @@
 import base64
 import hashlib
 import warnings
-from io import BytesIO
 
 from django.core.files.base import ContentFile
 from django.db.models.fields.files import FileDescriptor
@@ -150,13 +149,11 @@ class MultiStorageFileField(easy_thumbnails_fields.ThumbnailerField):
         if not filer_settings.FILER_DUMP_PAYLOAD:
             return value
         try:
-            payload_file = BytesIO(self.storage.open(value).read())
-            sha = hashlib.sha1()
-            sha.update(payload_file.read())
-            if sha.hexdigest() != obj.sha1:
+            with self.storage.open(value) as payload_file:
+                payload = payload_file.read()
+            if hashlib.sha1(payload).hexdigest() != obj.sha1:
                 warnings.warn('The checksum for "%s" diverges. Check for file consistency!' % obj.original_filename)
-            payload_file.seek(0)
-            encoded_string = base64.b64encode(payload_file.read()).decode('utf-8')
+            encoded_string = base64.b64encode(payload).decode('utf-8')
             return value, encoded_string
         except OSError:
             warnings.warn(f'The payload for "{obj.original_filename}" is missing. No such file on disk: {self.storage.location}!')
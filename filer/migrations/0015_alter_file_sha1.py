@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-15 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filer', '0014_folder_permission_choices'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='sha1',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40, verbose_name='sha1'),
+        ),
+    ]
@@ -2,10 +2,13 @@ import hashlib
 import mimetypes
 import os
 from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
+from operator import attrgetter, itemgetter
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
+from django.core.files import File as DjangoFile
 from django.db import models
 from django.urls import NoReverseMatch, reverse
 from django.utils import timezone
@@ -21,19 +24,137 @@ from . import mixins
 from .foldermodels import Folder
 
 
+# Read size used when hashing file contents. Small buffers stay cache
+# resident, which is what the OpenSSL SHA-1 implementation prefers.
+_SHA1_CHUNK = 1 << 16
+
+# Reference point for File.canonical_time
+_CANONICAL_EPOCH = datetime(1970, 1, 1, 1)
+_CANONICAL_EPOCH_UTC = datetime(1970, 1, 1, 1, tzinfo=timezone.utc)
+
+
+class _HashingFile(DjangoFile):
+    """
+    Wraps a file and computes the SHA-1 hash and size of the data read
+    through it, so that a storage backend can hash the file while saving it.
+    ``complete`` is False if the data was not read sequentially from the start.
+    """
+    def __init__(self, file, name=None):
+        super().__init__(file, name)
+        self._reset()
+
+    def _reset(self):
+        self.sha = hashlib.sha1()
+        self.bytes_read = 0
+        self.complete = True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if offset == 0 and whence == os.SEEK_SET:
+            self._reset()
+        else:
+            self.complete = False
+        return self.file.seek(offset, whence)
+
+    def read(self, *args, **kwargs):
+        data = self.file.read(*args, **kwargs)
+        self.sha.update(data)
+        self.bytes_read += len(data)
+        return data
+
+
 class FileManager(PolymorphicManager):
+    def _duplicate_hashes(self):
+        # kept as a queryset, so that it is used as a subquery by callers
+        return (
+            self.exclude(sha1='')
+            .order_by()
+            .values('sha1')
+            .annotate(count=models.Count('id'))
+            .filter(count__gt=1)
+            .values_list('sha1', flat=True)
+        )
+
     def find_all_duplicates(self):
-        r = {}
-        for file_obj in self.all():
-            if file_obj.sha1:
-                q = self.filter(sha1=file_obj.sha1)
-                if len(q) > 1:
-                    r[file_obj.sha1] = q
-        return r
+        files = self.filter(sha1__in=self._duplicate_hashes()).order_by('sha1', 'pk')
+        return {sha1: list(group) for sha1, group in groupby(files, key=attrgetter('sha1'))}
+
+    def find_all_duplicates_light(self):
+        """
+        Like ``find_all_duplicates``, but returns ``(id, original_filename, size)``
+        tuples instead of model instances, so no polymorphic subclass rows
+        have to be fetched.
+        """
+        rows = (
+            self.filter(sha1__in=self._duplicate_hashes())
+            .order_by('sha1', 'pk')
+            .values_list('sha1', 'id', 'original_filename', '_file_size')
+        )
+        return {
+            sha1: [row[1:] for row in group]
+            for sha1, group in groupby(rows, key=itemgetter(0))
+        }
 
     def find_duplicates(self, file_obj):
         return [i for i in self.exclude(pk=file_obj.pk).filter(sha1=file_obj.sha1)]
 
+    def prefetch_logical_paths(self, files):
+        """
+        Loads the folders of the given File objects and all their ancestors
+        with two queries, so that ``logical_path`` doesn't have to query the
+        database for each file. Returns the files as a list.
+        """
+        files = list(files)
+        folder_ids = {file_obj.folder_id for file_obj in files if file_obj.folder_id}
+        folders = {folder.pk: folder for folder in Folder.objects.filter(pk__in=folder_ids)}
+        if not folders:
+            return files
+        # Only inner nodes above the deepest folder can be ancestors, which
+        # keeps unrelated leaf folders of large trees out of the query.
+        max_level = max(folder.level for folder in folders.values())
+        candidates = {}
+        if max_level > 0:
+            candidates = {
+                folder.pk: folder for folder in Folder.objects.filter(
+                    tree_id__in={folder.tree_id for folder in folders.values()},
+                    level__lt=max_level,
+                    rght__gt=models.F('lft') + 1,
+                )
+            }
+        for folder in folders.values():
+            ancestors = []
+            parent_id = folder.parent_id
+            while parent_id is not None and parent_id in candidates:
+                ancestors.append(candidates[parent_id])
+                parent_id = candidates[parent_id].parent_id
+            if parent_id is None:
+                folder._prefetched_ancestors = ancestors[::-1]
+        for file_obj in files:
+            if file_obj.folder_id:
+                file_obj.folder = folders[file_obj.folder_id]
+        return files
+
+    def delete_files(self, files):
+        """
+        Deletes the given File objects, like calling ``delete()`` on each of
+        them, but looks up the remaining references to their files on storage
+        in a single query instead of one query per object.
+        """
+        files = list(files)
+        for file_obj in files:
+            file_obj.delete(delete_file=False)
+        names = {file_obj.file.name for file_obj in files if file_obj.file}
+        referenced = set(
+            File.objects.filter(file__in=names)
+            .values_list('file', 'is_public')
+            .distinct()
+        )
+        for file_obj in files:
+            key = (file_obj.file.name, file_obj.is_public)
+            if file_obj.file and key not in referenced:
+                file_obj.file.delete(False)
+                # don't try to delete a file shared by several objects twice
+                referenced.add(key)
+
 
 def is_public_default():
     # not using this setting directly as `is_public` default value
@@ -41,8 +162,18 @@ def is_public_default():
     return filer_settings.FILER_IS_PUBLIC_DEFAULT
 
 
+@lru_cache(maxsize=512)
+def _guess_extension(mime_type):
+    return mimetypes.guess_extension(mime_type)
+
+
+@lru_cache(maxsize=None)
+def _admin_url_name(opts, action):
+    return f'admin:{opts.app_label}_{opts.model_name}_{action}'
+
+
 def mimetype_validator(value):
-    if not mimetypes.guess_extension(value):
+    if not _guess_extension(value):
         msg = "'{mimetype}' is not a recognized MIME-Type."
         raise ValidationError(msg.format(mimetype=value))
 
@@ -79,6 +210,7 @@ class File(PolymorphicModel, mixins.IconsMixin):
         max_length=40,
         blank=True,
         default='',
+        db_index=True,
     )
 
     has_all_mandatory_data = models.BooleanField(
@@ -154,6 +286,12 @@ class File(PolymorphicModel, mixins.IconsMixin):
             text = f"{self.name}"
         return text
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Subclasses of "File" carry their class name as _file_type_plugin_name.
+        # This is resolved once per class instead of on every save().
+        cls._file_type_plugin_name = cls.__name__
+
     @classmethod
     def matches_file_type(cls, iname, ifile, mime_type):
         return True  # I match all files...
@@ -163,13 +301,18 @@ class File(PolymorphicModel, mixins.IconsMixin):
         self._old_is_public = self.is_public
         self.file_data_changed(post_init=True)
 
+    @cached_property
+    def _mime_parts(self):
+        maintype, _, subtype = self.mime_type.partition('/')
+        return maintype, subtype
+
     @cached_property
     def mime_maintype(self):
-        return self.mime_type.split('/')[0]
+        return self._mime_parts[0]
 
     @cached_property
     def mime_subtype(self):
-        return self.mime_type.split('/')[1]
+        return self._mime_parts[1]
 
     def file_data_changed(self, post_init=False):
         """
@@ -183,20 +326,32 @@ class File(PolymorphicModel, mixins.IconsMixin):
             self._file_data_changed_hint = None
             if not data_changed_hint:
                 return False
-        if post_init and self._file_size and self.sha1:
-            # When called from __init__, only update if values are empty.
-            # This makes sure that nothing is done when instantiated from db.
-            return False
-        # cache the file size
-        try:
-            self._file_size = self.file.size
-        except:   # noqa
-            self._file_size = None
-        # generate SHA1 hash
-        try:
-            self.generate_sha1()
-        except Exception:
-            self.sha1 = ''
+        if post_init:
+            if any(attname not in self.__dict__ for attname in ('file', '_file_size', 'sha1')):
+                # Don't load deferred fields from the db (one query per field
+                # and instance) just to find out whether they need updating.
+                return False
+            # When called from __init__, only update values which are empty.
+            # This makes sure that nothing is done when instantiated from db,
+            # and that a missing hash doesn't cause the size to be fetched
+            # again from the storage (and vice versa).
+            update_size, update_sha1 = not self._file_size, not self.sha1
+            if not (update_size or update_sha1):
+                return False
+        else:
+            update_size = update_sha1 = True
+        if update_size:
+            # cache the file size
+            try:
+                self._file_size = self.file.size
+            except:   # noqa
+                self._file_size = None
+        if update_sha1:
+            # generate SHA1 hash
+            try:
+                self.generate_sha1()
+            except Exception:
+                self.sha1 = ''
         return True
 
     def _move_file(self):
@@ -223,12 +378,18 @@ class File(PolymorphicModel, mixins.IconsMixin):
         # This is needed because most of the remote File Storage backend do not
         # open the file.
         src_file = src_storage.open(src_file_name)
-        # Context manager closes file after reading contents
+        # Context manager closes file after copying contents. The storage
+        # consumes it in chunks, so it is never read into memory at once.
+        # The hash is computed on the fly from the same chunks.
         with src_file.open() as f:
-            content_file = ContentFile(f.read())
+            content = _HashingFile(f)
+            dst_file_name = dst_storage.save(dst_file_name, content)
+            if content.complete and content.bytes_read == content.size:
+                self.sha1 = content.sha.hexdigest()
+                self._file_size = content.bytes_read
         # hint file_data_changed callback that data is actually unchanged
         self._file_data_changed_hint = False
-        self.file = dst_storage.save(dst_file_name, content_file)
+        self.file = dst_file_name
         src_storage.delete(src_file_name)
 
     def _copy_file(self, destination, overwrite=False):
@@ -248,42 +409,48 @@ class File(PolymorphicModel, mixins.IconsMixin):
         # This is needed because most of the remote File Storage backend do not
         # open the file.
         src_file = storage.open(src_file_name)
-        src_file.open()
-        return storage.save(destination, ContentFile(src_file.read()))
+        with src_file.open() as f:
+            return storage.save(destination, f)
 
     def generate_sha1(self):
-        sha = hashlib.sha1()
         self.file.seek(0)
-        while True:
-            buf = self.file.read(104857600)
-            if not buf:
-                break
-            sha.update(buf)
+        # some remote storage backends return file objects without readinto()
+        readinto = getattr(self.file, 'readinto', None)
+        if readinto is not None and hasattr(hashlib, 'file_digest'):
+            # Python 3.11+
+            sha = hashlib.file_digest(self.file, 'sha1')
+        elif readinto is not None:
+            sha = hashlib.sha1()
+            buf = bytearray(_SHA1_CHUNK)
+            view = memoryview(buf)
+            while True:
+                size = readinto(buf)
+                if not size:
+                    break
+                sha.update(view[:size])
+        else:
+            sha = hashlib.sha1()
+            while True:
+                chunk = self.file.read(_SHA1_CHUNK)
+                if not chunk:
+                    break
+                sha.update(chunk)
         self.sha1 = sha.hexdigest()
         # to make sure later operations can read the whole file
         self.file.seek(0)
 
     def save(self, *args, **kwargs):
-        # check if this is a subclass of "File" or not and set
-        # _file_type_plugin_name
-        if self.__class__ == File:
-            # what should we do now?
-            # maybe this has a subclass, but is being saved as a File instance
-            # anyway. do we need to go check all possible subclasses?
-            pass
-        elif issubclass(self.__class__, File):
-            self._file_type_plugin_name = self.__class__.__name__
         if self._old_is_public != self.is_public and self.pk:
             self._move_file()
             self._old_is_public = self.is_public
         super().save(*args, **kwargs)
     save.alters_data = True
 
-    def delete(self, *args, **kwargs):
+    def delete(self, *args, delete_file=True, **kwargs):
         # Delete the model before the file
         super().delete(*args, **kwargs)
         # Delete the file if there are no other Files referencing it.
-        if not File.objects.filter(file=self.file.name, is_public=self.is_public).exists():
+        if delete_file and not File.objects.filter(file=self.file.name, is_public=self.is_public).exists():
             self.file.delete(False)
     delete.alters_data = True
 
@@ -296,8 +463,12 @@ class File(PolymorphicModel, mixins.IconsMixin):
         text = f"{text}"
         return text
 
+    @cached_property
+    def _sort_key(self):
+        return self.label.casefold()
+
     def __lt__(self, other):
-        return self.label.lower() < other.label.lower()
+        return self._sort_key < other._sort_key
 
     def has_edit_permission(self, request):
         return self.has_generic_permission(request, 'edit')
@@ -326,18 +497,10 @@ class File(PolymorphicModel, mixins.IconsMixin):
             return False
 
     def get_admin_change_url(self):
-        return reverse(
-            'admin:{}_{}_change'.format(
-                self._meta.app_label,
-                self._meta.model_name,
-            ),
-            args=(self.pk,)
-        )
+        return reverse(_admin_url_name(self._meta, 'change'), args=(self.pk,))
 
     def get_admin_delete_url(self):
-        return reverse(
-            f'admin:{self._meta.app_label}_{self._meta.model_name}_delete',
-            args=(self.pk,))
+        return reverse(_admin_url_name(self._meta, 'delete'), args=(self.pk,))
 
     @property
     def url(self):
@@ -350,12 +513,10 @@ class File(PolymorphicModel, mixins.IconsMixin):
             r = ''
         return r
 
-    @property
+    @cached_property
     def canonical_time(self):
-        if settings.USE_TZ:
-            return int((self.uploaded_at - datetime(1970, 1, 1, 1, tzinfo=timezone.utc)).total_seconds())
-        else:
-            return int((self.uploaded_at - datetime(1970, 1, 1, 1)).total_seconds())
+        epoch = _CANONICAL_EPOCH_UTC if settings.USE_TZ else _CANONICAL_EPOCH
+        return int((self.uploaded_at - epoch).total_seconds())
 
     @property
     def canonical_url(self):
@@ -383,10 +544,15 @@ class File(PolymorphicModel, mixins.IconsMixin):
 
     @property
     def extension(self):
-        filetype = os.path.splitext(self.file.name)[1].lower()
-        if len(filetype) > 0:
-            filetype = filetype[1:]
-        return filetype
+        # Same result as os.path.splitext(), without its generic path handling.
+        # Storage names always use forward slashes and leading dots of the
+        # basename don't start an extension.
+        name = self.file.name or ''
+        basename = name[name.rfind('/') + 1:].lstrip('.')
+        dot = basename.rfind('.')
+        if dot < 0:
+            return ''
+        return basename[dot + 1:].lower()
 
     @property
     def logical_folder(self):
@@ -408,7 +574,11 @@ class File(PolymorphicModel, mixins.IconsMixin):
         """
         folder_path = []
         if self.folder:
-            folder_path.extend(self.folder.get_ancestors())
+            # set by FileManager.prefetch_logical_paths()
+            ancestors = getattr(self.folder, '_prefetched_ancestors', None)
+            if ancestors is None:
+                ancestors = self.folder.get_ancestors()
+            folder_path.extend(ancestors)
         folder_path.append(self.logical_folder)
         return folder_path
 
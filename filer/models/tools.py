@@ -1,4 +1,4 @@
-from . import Clipboard
+from . import Clipboard, File
 
 
 def discard_clipboard(clipboard):
@@ -6,8 +6,7 @@ def discard_clipboard(clipboard):
 
 
 def delete_clipboard(clipboard):
-    for file_obj in clipboard.files.all():
-        file_obj.delete()
+    File.objects.delete_files(clipboard.files.all())
 
 
 def get_user_clipboard(user):
@@ -1,7 +1,11 @@
+import hashlib
 import os
+from contextlib import contextmanager
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files import File as DjangoFile
+from django.db.models.signals import post_init
 from django.forms.models import modelform_factory
 from django.test import TestCase
 
@@ -13,14 +17,31 @@ from filer.models.mixins import IconsMixin
 from filer.settings import FILER_IMAGE_MODEL
 from filer.utils.loader import load_model
 from tests.helpers import (
-    create_clipboard_item, create_folder_structure, create_image,
-    create_superuser,
+    SettingsOverride, create_clipboard_item, create_folder_structure,
+    create_image, create_superuser,
 )
 
 
 Image = load_model(FILER_IMAGE_MODEL)
 
 
+@contextmanager
+def count_instances(model):
+    """
+    Collects all instances of ``model`` created within the context.
+    """
+    instances = []
+
+    def receiver(sender, instance, **kwargs):
+        instances.append(instance)
+
+    post_init.connect(receiver, sender=model)
+    try:
+        yield instances
+    finally:
+        post_init.disconnect(receiver, sender=model)
+
+
 class FilerApiTests(TestCase):
 
     def setUp(self):
@@ -132,6 +153,15 @@ class FilerApiTests(TestCase):
         image.save()
         self.assertTrue(image.file.path.startswith(filer_settings.FILER_PUBLICMEDIA_STORAGE.location))
 
+    def test_file_move_updates_sha1(self):
+        image = self.create_filer_image()
+        sha1, size = image.sha1, image.size
+        image.sha1, image._file_size = '', None
+        image.is_public = not image.is_public
+        image.save()
+        self.assertEqual(image.sha1, sha1)
+        self.assertEqual(image.size, size)
+
     def test_file_change_upload_to_destination(self):
         """
         Test that the file is actualy move from the private to the public
@@ -210,6 +240,165 @@ class FilerApiTests(TestCase):
         # file should still be here
         self.assertTrue(storage.exists(name))
 
+    def test_file_sha1(self):
+        image = self.create_filer_image()
+        with open(self.filename, 'rb') as fh:
+            expected = hashlib.sha1(fh.read()).hexdigest()
+        self.assertEqual(image.sha1, expected)
+        image.generate_sha1()
+        self.assertEqual(image.sha1, expected)
+
+    def test_find_all_duplicates(self):
+        file_1 = self.create_filer_image()
+        file_2 = self.create_filer_image()
+        other = File.objects.create(
+            owner=self.superuser,
+            original_filename='other.txt',
+            file=DjangoFile(BytesIO(b'other content'), name='other.txt'),
+        )
+        self.assertNotEqual(file_1.sha1, other.sha1)
+        # one query for the duplicates, one for the polymorphic Image rows
+        with self.assertNumQueries(2):
+            duplicates = File.objects.find_all_duplicates()
+        self.assertEqual(list(duplicates), [file_1.sha1])
+        self.assertEqual(
+            [f.pk for f in duplicates[file_1.sha1]],
+            [file_1.pk, file_2.pk],
+        )
+        self.assertEqual(File.objects.find_duplicates(file_1), [file_2])
+        with self.assertNumQueries(1):
+            light_duplicates = File.objects.find_all_duplicates_light()
+        self.assertEqual(light_duplicates, {
+            file_1.sha1: [
+                (file_1.pk, self.image_name, file_1.size),
+                (file_2.pk, self.image_name, file_2.size),
+            ],
+        })
+
+    def test_delete_files(self):
+        file_1 = self.create_filer_image()
+        file_2 = File.objects.get(pk=file_1.pk)
+        file_2.pk = None
+        file_2.id = None
+        file_2.save()
+        other = File.objects.create(
+            owner=self.superuser,
+            original_filename='other.txt',
+            file=DjangoFile(BytesIO(b'other content'), name='other.txt'),
+        )
+        storage, name = file_1.file.storage, file_1.file.name
+        other_storage, other_name = other.file.storage, other.file.name
+
+        File.objects.delete_files([file_1, other])
+        self.assertEqual(list(File.objects.all()), [file_2])
+        # still referenced by file_2
+        self.assertTrue(storage.exists(name))
+        self.assertFalse(other_storage.exists(other_name))
+
+        File.objects.delete_files(File.objects.all())
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(storage.exists(name))
+
+    def test_mime_types(self):
+        file_obj = File(mime_type='image/svg+xml')
+        self.assertEqual(file_obj.mime_maintype, 'image')
+        self.assertEqual(file_obj.mime_subtype, 'svg+xml')
+        file_obj = File(mime_type='application')
+        self.assertEqual(file_obj.mime_maintype, 'application')
+        self.assertEqual(file_obj.mime_subtype, '')
+
+    def test_deferred_file_data_not_loaded_on_init(self):
+        self.create_filer_image()
+        self.create_filer_image()
+        with self.assertNumQueries(1):
+            files = list(File.objects.non_polymorphic().defer('sha1', '_file_size'))
+        self.assertEqual(len(files), 2)
+
+    def test_prefetch_logical_paths(self):
+        root = Folder.objects.create(name='root')
+        child = Folder.objects.create(name='child', parent=root)
+        grandchild = Folder.objects.create(name='grandchild', parent=child)
+        for folder in (None, root, child, grandchild):
+            File.objects.create(
+                original_filename='file.txt',
+                file=DjangoFile(BytesIO(b'content'), name='file.txt'),
+                folder=folder,
+            )
+        expected = [file_obj.logical_path for file_obj in File.objects.order_by('pk')]
+        with self.assertNumQueries(3):
+            files = File.objects.prefetch_logical_paths(File.objects.order_by('pk'))
+            paths = [file_obj.logical_path for file_obj in files]
+        self.assertEqual(paths[1:], expected[1:])
+        self.assertEqual(paths[3], [root, child, grandchild])
+        self.assertEqual(paths[0][0].name, expected[0][0].name)
+
+    def test_extension(self):
+        for name, extension in [
+            ('filer_public/ab/cd/image.JPG', 'jpg'),
+            ('filer_public/archive.tar.gz', 'gz'),
+            ('filer_public/some.dir/README', ''),
+            ('filer_public/.hidden', ''),
+            ('filer_public/..hidden.txt', 'txt'),
+            ('file.', ''),
+        ]:
+            file_obj = File(file=name)
+            self.assertEqual(file_obj.extension, extension)
+            self.assertEqual(
+                file_obj.extension,
+                os.path.splitext(name)[1].lower()[1:],
+            )
+
+    def test_file_data_updates_only_missing_values(self):
+        image = self.create_filer_image()
+        File.objects.filter(pk=image.pk).update(sha1='', _file_size=42)
+        reloaded = File.objects.get(pk=image.pk)
+        self.assertEqual(reloaded.sha1, image.sha1)
+        self.assertEqual(reloaded.size, 42)
+
+    def test_is_public_default_follows_setting(self):
+        with SettingsOverride(filer_settings, FILER_IS_PUBLIC_DEFAULT=False):
+            self.assertFalse(File().is_public)
+        with SettingsOverride(filer_settings, FILER_IS_PUBLIC_DEFAULT=True):
+            self.assertTrue(File().is_public)
+
+    def test_prefetch_logical_paths_many_folders(self):
+        root = Folder.objects.create(name='root')
+        folders = Folder.objects.bulk_create([
+            Folder(name=f'folder {i}', parent=root, tree_id=root.tree_id,
+                   lft=2 * i + 2, rght=2 * i + 3, level=1)
+            for i in range(1100)
+        ])
+        Folder.objects.filter(pk=root.pk).update(rght=2 * len(folders) + 2)
+        files = [
+            File(pk=i, original_filename='file.txt', folder_id=folder.pk)
+            for i, folder in enumerate(Folder.objects.filter(parent=root), start=1)
+        ]
+        with self.assertNumQueries(2), count_instances(Folder) as loaded:
+            files = File.objects.prefetch_logical_paths(files)
+        self.assertEqual(len(files), 1100)
+        # the 1100 folders and their root
+        self.assertEqual(len(loaded), 1101)
+        for file_obj in files:
+            self.assertEqual(file_obj.logical_path, [root, file_obj.folder])
+
+    def test_prefetch_logical_paths_skips_unrelated_folders(self):
+        root = Folder.objects.create(name='root')
+        child = Folder.objects.create(name='child', parent=root)
+        grandchild = Folder.objects.create(name='grandchild', parent=child)
+        Folder.objects.bulk_create([
+            Folder(name=f'leaf {i}', parent=parent, tree_id=0, lft=0, rght=0, level=0)
+            for parent in (root, child) for i in range(500)
+        ])
+        Folder._tree_manager.rebuild()
+        file_obj = File(original_filename='file.txt', folder_id=grandchild.pk)
+        with self.assertNumQueries(2), count_instances(Folder) as loaded:
+            file_obj, = File.objects.prefetch_logical_paths([file_obj])
+        self.assertEqual(
+            sorted(folder.name for folder in loaded),
+            ['child', 'grandchild', 'root'],
+        )
+        self.assertEqual(file_obj.logical_path, [root, child, grandchild])
+
     def test_folder_quoted_logical_path(self):
         root_folder = Folder.objects.create(name="Foo's Bar", parent=None)
         child = Folder.objects.create(name='Bar"s Foo', parent=root_folder)
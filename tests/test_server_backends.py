@@ -1,6 +1,6 @@
-import os
 import time
 
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import Http404, HttpResponseNotModified
 from django.test import TestCase
@@ -19,20 +19,36 @@ class Mock():
 
 
 class BaseServerBackendTestCase(TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
         original_filename, mime_type = 'testimage.jpg', 'image/jpeg'
+        cls.file_content = create_image().tobytes()
         file_obj = SimpleUploadedFile(
             name=original_filename,
-            content=create_image().tobytes(),
+            content=cls.file_content,
             content_type=mime_type)
-        self.filer_file = File.objects.create(
+        filer_file = File.objects.create(
             is_public=False,
             file=file_obj,
             original_filename=original_filename,
             mime_type=mime_type)
+        cls.filer_file_id = filer_file.pk
+
+    @classmethod
+    def tearDownClass(cls):
+        # the database row is rolled back, but the file in storage must be removed
+        File.objects.get(pk=cls.filer_file_id).file.delete(False)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.filer_file = File.objects.get(pk=self.filer_file_id)
+        # restore the file if a previous test removed it from storage
+        storage, name = self.filer_file.file.storage, self.filer_file.file.name
+        if not storage.exists(name):
+            storage.save(name, ContentFile(self.file_content))
 
-    def tearDown(self):
-        self.filer_file.delete()
+    def delete_file_from_storage(self):
+        self.filer_file.file.storage.delete(self.filer_file.file.name)
 
 
 class DefaultServerTestCase(BaseServerBackendTestCase):
@@ -67,7 +83,7 @@ class DefaultServerTestCase(BaseServerBackendTestCase):
         server = DefaultServer()
         request = Mock()
         request.headers = {}
-        os.remove(self.filer_file.file.path)
+        self.delete_file_from_storage()
         self.assertRaises(Http404, server.serve, *(request, self.filer_file.file))
 
 
@@ -96,7 +112,7 @@ class NginxServerTestCase(BaseServerBackendTestCase):
         """
         request = Mock()
         request.headers = {}
-        os.remove(self.filer_file.file.path)
+        self.delete_file_from_storage()
         response = self.server.serve(request, self.filer_file)
         headers = dict(response.items())
         self.assertTrue(response.has_header('X-Accel-Redirect'))
@@ -126,7 +142,7 @@ class XSendfileServerTestCase(BaseServerBackendTestCase):
         """
         request = Mock()
         request.headers = {}
-        os.remove(self.filer_file.file.path)
+        self.delete_file_from_storage()
         response = self.server.serve(request, self.filer_file)
         headers = dict(response.items())
         self.assertTrue(response.has_header('X-Sendfile'))